@@ -1,22 +1,116 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple
+import asyncio
+import logging
 import os
 import sys
-import time
+import uuid
+
+import aiohttp
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from utils.search_utils import SearchHandler
+from utils.search_utils import SearchHandler, canonicalize_url, create_http_session, is_scrapable_url
 from utils.ai_utils import AIHandler
+from utils.cache_utils import SemanticCache
+from core.state_store import DiskState
+
+logger = logging.getLogger(__name__)
+
+# Research fan-out limits
+RESULTS_PER_QUERY = 5
+MAX_SCRAPED_ARTICLES = 25
+MAX_CONCURRENT_SCRAPES = 20
+
+# Per-source limits applied as soon as a page is scraped; later steps never
+# use more than this, so it is not kept in state or sent to the model
+MAX_SOURCE_CHARS = 4000
+MAX_SOURCE_HEADINGS = 10
+
+# Sources shorter than this are already about summary size and are sent as is
+SUMMARY_MIN_CHARS = 2000
+
+# State reused when a new topic is semantically close to a previous one
+SEMANTIC_STATE_KEYS = (
+    "search_queries",
+    "search_results",
+    "scraped_content",
+    "primary_keyword",
+    "secondary_keywords",
+    "title",
+    "outline",
+    "article"
+)
+
+def compact_source(scraped_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce a scraped page to the fields used downstream.
+    
+    Args:
+        scraped_data: Dictionary returned by the scraper
+        
+    Every field is copied into a plain str, so nothing from the parsed page
+    (e.g. a bs4 NavigableString referencing the whole tree) outlives this call
+    and the full page can be freed as soon as it is compacted.
+    
+    Returns:
+        Dictionary with the title, URL, leading headings and trimmed content
+    """
+    return {
+        "title": str(scraped_data.get("title", "")),
+        "url": str(scraped_data.get("url", "")),
+        "headings": [
+            {"level": str(heading.get("level", "")), "text": str(heading.get("text", ""))}
+            for heading in scraped_data.get("headings", [])[:MAX_SOURCE_HEADINGS]
+        ],
+        "content": str(scraped_data.get("content", "")[:MAX_SOURCE_CHARS])
+    }
+
+def apportion_word_count(word_count: int, outline: List[str]) -> List[int]:
+    """
+    Split the article word count across outline sections.
+    
+    Introductions and conclusions get half the share of a body section.
+    
+    Args:
+        word_count: Target word count for the whole article
+        outline: Article outline, one section per item
+        
+    Returns:
+        Word budget for each outline item, in order
+    """
+    weights = [
+        0.5 if item.strip().lower().startswith(("intro", "conclusion")) else 1.0
+        for item in outline
+    ]
+    total_weight = sum(weights)
+    return [max(50, round(word_count * weight / total_weight)) for weight in weights]
 
 class BlogWriter:
     """Manages the complete blog writing process."""
     
-    def __init__(self):
-        """Initialize the blog writer with required handlers."""
-        self.search_handler = SearchHandler()
+    def __init__(self, session_id: Optional[str] = None):
+        """
+        Initialize the blog writer with required handlers.
+        
+        Args:
+            session_id: Identifier of the session whose on-disk state to use;
+                an existing session's state is resumed, a new one is created if omitted
+        """
+        self.http_session = create_http_session()
+        self.search_handler = SearchHandler(session=self.http_session)
         self.ai_handler = AIHandler()
-        self.state = {
+        self.semantic_cache = SemanticCache()
+        self._topic_embedding = None
+        self._semantic_entry = None
+        self.session_id = session_id or uuid.uuid4().hex
+        self.state = DiskState(self.session_id)
+        if "topic" not in self.state:
+            self.state.update(self._empty_state())
+    
+    def _empty_state(self) -> Dict[str, Any]:
+        """Build the state of a blog writer that has not processed a topic yet."""
+        return {
             "topic": None,
             "search_queries": [],
             "search_results": [],
@@ -28,114 +122,281 @@ class BlogWriter:
             "article": None
         }
     
-    def process_topic(self, topic: str) -> Dict[str, Any]:
+    def close(self) -> None:
+        """Release pooled HTTP connections and the databases held by the blog writer."""
+        self.search_handler.close()
+        self.ai_handler.close()
+        self.semantic_cache.close()
+        self.state.close()
+    
+    def __del__(self):
+        """Close pooled connections when the blog writer is garbage collected."""
+        try:
+            self.close()
+        except Exception:
+            pass
+    
+    def process_topic(self, topic: str, force_refresh: bool = False) -> Dict[str, Any]:
         """
         Process the user's topic to generate search queries.
         
         Args:
             topic: User's input topic
+            force_refresh: Bypass cached model responses
             
         Returns:
             Dictionary containing processed topic data and search queries
         """
+        # Start from a clean state so work for a previous topic is not carried over
+        self.state.update(self._empty_state())
+        
         # Store the topic in state
         self.state["topic"] = topic
         
-        # Generate search queries using AI
-        search_queries = self.ai_handler.generate_search_queries(topic)
-        self.state["search_queries"] = search_queries
+        # Reuse earlier work if a semantically similar topic was already processed
+        self._topic_embedding = self.ai_handler.embed_text(topic)
+        self._semantic_entry = None
+        if self._topic_embedding is not None and not force_refresh:
+            hit = self.semantic_cache.lookup(self._topic_embedding)
+            if hit:
+                self._semantic_entry, cached_state = hit
+                for key in SEMANTIC_STATE_KEYS:
+                    if key in cached_state:
+                        self.state[key] = cached_state[key]
+                return {
+                    "topic": topic,
+                    "search_queries": self.state["search_queries"]
+                }
+        
+        # Generate search queries using AI; generic fallback queries are not worth remembering
+        try:
+            search_queries = self.ai_handler.generate_search_queries(
+                topic,
+                force_refresh=force_refresh,
+                use_fallback=False
+            )
+        except Exception as e:
+            logger.warning("Error generating search queries: %s", e)
+            search_queries = self.ai_handler.fallback_queries(topic)
+            self.state["search_queries"] = search_queries
+        else:
+            self.state["search_queries"] = search_queries
+            self._remember_topic()
         
         return {
             "topic": topic,
             "search_queries": search_queries
         }
     
+    def _remember_topic(self) -> None:
+        """Save the current state in the semantic cache under the current topic's embedding."""
+        if self._topic_embedding is None:
+            return
+        
+        snapshot = {key: self.state[key] for key in SEMANTIC_STATE_KEYS}
+        self._semantic_entry = self.semantic_cache.put(
+            self._topic_embedding,
+            snapshot,
+            self._semantic_entry
+        )
+    
     def perform_research(self) -> List[Dict[str, Any]]:
         """
         Perform research by searching the web and scraping content.
         
+        Returns:
+            List of dictionaries containing search results and scraped content
+        """
+        return asyncio.run(self.perform_research_async())
+    
+    async def perform_research_async(self) -> List[Dict[str, Any]]:
+        """
+        Perform research as a pipeline: all searches are issued at once and the
+        top results of each query start scraping as soon as that query's search
+        returns, under a concurrency cap.
+        
         Returns:
             List of dictionaries containing search results and scraped content
         """
         if not self.state["search_queries"]:
             raise ValueError("Search queries must be generated first")
         
-        all_search_results = []
-        all_scraped_content = []
+        queries = self.state["search_queries"]
+        search_batches: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        usable: List[Tuple[Tuple[int, int], Dict[str, Any]]] = []
+        seen_urls = set()
+        url_queue: asyncio.Queue = asyncio.Queue()
+        enough = asyncio.Event()
         
-        # For each query, search and get the top results
-        for query in self.state["search_queries"]:
-            # Slight delay to avoid rate limiting
-            time.sleep(0.5)
+        # Async clients are bound to the running event loop, so the async
+        # path pools connections for the duration of one research run.
+        # Searches all go to Serper over one HTTP/2 connection; scrapes fan
+        # out to many hosts over aiohttp
+        connector = aiohttp.TCPConnector(limit=50, keepalive_timeout=30)
+        async with self.search_handler.open_async_client() as search_client, \
+                aiohttp.ClientSession(connector=connector) as session:
             
-            # Get search results
-            search_results = self.search_handler.search_web(query)
-            if not search_results:  # Skip if no results
-                continue
+            async def search(query_index: int, query: str) -> None:
+                search_results = await self.search_handler.search_web_async(search_client, query)
+                if not search_results:  # Skip if no results
+                    return
+                search_batches[query_index] = search_results
                 
-            all_search_results.extend(search_results)
-            
-            # Scrape the top 5 results for each query
-            for result in search_results[:5]:
-                if not result:  # Skip None results
-                    continue
+                # Queue the top results, skipping pages already picked up by another query
+                for result_index, result in enumerate(search_results[:RESULTS_PER_QUERY]):
+                    if not result:  # Skip None results
+                        continue
                     
-                url = result.get("link", "")
-                if not url:  # Skip if no URL
-                    continue
+                    url = result.get("link", "")
+                    if not url:  # Skip if no URL
+                        continue
                     
-                scraped_data = self.search_handler.scrape_content(url)
-                if not scraped_data:  # Skip if scraping failed
-                    continue
+                    if not is_scrapable_url(url):  # Skip video, social, paywalled and binary pages
+                        continue
                     
-                content = scraped_data.get("content", "")
-                if content and len(content) > 100:  # Only add if has meaningful content
-                    all_scraped_content.append(scraped_data)
+                    canonical_url = canonicalize_url(url)
+                    if canonical_url in seen_urls:
+                        continue
+                    seen_urls.add(canonical_url)
+                    url_queue.put_nowait(((query_index, result_index), url))
+            
+            async def scrape_worker() -> None:
+                while True:
+                    item = await url_queue.get()
+                    if item is None:  # All searches are done and the queue is drained
+                        return
+                    
+                    rank, url = item
+                    scraped_data = await self.search_handler.scrape_content_async(session, url)
+                    if not scraped_data:  # Skip if scraping failed
+                        continue
+                    
+                    content = scraped_data.get("content", "")
+                    if content and len(content) > 100:  # Only add if has meaningful content
+                        usable.append((rank, compact_source(scraped_data)))
+                        
+                        # If we have enough content, stop
+                        if len(usable) >= MAX_SCRAPED_ARTICLES:
+                            enough.set()
+            
+            # A fixed pool of workers bounds in-flight scrapes however many URLs are found
+            workers = [asyncio.create_task(scrape_worker()) for _ in range(MAX_CONCURRENT_SCRAPES)]
+            searches = [asyncio.create_task(search(i, query)) for i, query in enumerate(queries)]
+            
+            async def drain() -> None:
+                await asyncio.gather(*searches)
+                for _ in workers:
+                    url_queue.put_nowait(None)
+                await asyncio.gather(*workers)
             
-            # If we have enough content, stop
-            if len(all_scraped_content) >= 25:
-                break
+            drained = asyncio.create_task(drain())
+            stopped = asyncio.create_task(enough.wait())
+            try:
+                await asyncio.wait({drained, stopped}, return_when=asyncio.FIRST_COMPLETED)
+                if drained.done():
+                    drained.result()  # Surface a failed search or scrape
+            finally:
+                # Cancel work that is no longer needed and reap it
+                pending = [drained, stopped, *searches, *workers]
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        # Keep search ranking order (query order, then result position) rather than completion order
+        usable.sort(key=lambda item: item[0])
+        all_scraped_content = [data for _, data in usable[:MAX_SCRAPED_ARTICLES]]
+        all_search_results = [result for batch in search_batches for result in batch]
+        logger.info(
+            "Research: %d/%d URLs yielded usable content",
+            len(all_scraped_content), len(seen_urls)
+        )
         
         # Store in state
         self.state["search_results"] = all_search_results
         self.state["scraped_content"] = all_scraped_content
+        self._remember_topic()
         
         return all_scraped_content
     
-    def analyze_content(self) -> Dict[str, Any]:
+    def analyze_content(self, force_refresh: bool = False) -> Dict[str, Any]:
         """
         Analyze the scraped content to extract keywords, title, and outline.
         
+        Args:
+            force_refresh: Bypass cached model responses
+            
         Returns:
             Dictionary containing analysis results
         """
         if not self.state["scraped_content"]:
             raise ValueError("Scraped content must be available first")
         
-        print("\n\nSTARTING CONTENT ANALYSIS...")
+        logger.debug("Starting content analysis")
         
-        # Analyze the content using AI
-        analysis = self.ai_handler.analyze_content(
-            self.state["topic"],
-            self.state["scraped_content"]
-        )
+        # Condense long sources first so the analysis prompt stays small
+        sources = asyncio.run(self._summarize_sources(force_refresh))
         
-        # Print the parsed analysis for debugging
-        print("\n\nPARSED ANALYSIS OUTPUT:")
-        print(f"Primary Keyword: {analysis.get('primary_keyword')}")
-        print(f"Secondary Keywords: {analysis.get('secondary_keywords', [])}")
-        print(f"Title: {analysis.get('title')}")
-        print(f"Outline: {analysis.get('outline', [])}")
-        print("\n\nEND OF PARSED ANALYSIS")
+        # Analyze the content using AI; a generic fallback analysis is not remembered
+        failed = False
+        try:
+            analysis = self.ai_handler.analyze_content(
+                self.state["topic"],
+                sources,
+                force_refresh=force_refresh,
+                use_fallback=False
+            )
+        except Exception as e:
+            logger.warning("Error analyzing content: %s", e)
+            analysis = self.ai_handler.fallback_analysis(self.state["topic"])
+            failed = True
+        
+        # Log the parsed analysis for debugging; skipped entirely unless DEBUG is enabled
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Parsed analysis output:\n"
+                f"Primary Keyword: {analysis.get('primary_keyword')}\n"
+                f"Secondary Keywords: {analysis.get('secondary_keywords', [])}\n"
+                f"Title: {analysis.get('title')}\n"
+                f"Outline: {analysis.get('outline', [])}"
+            )
         
         # Store in state
         self.state["primary_keyword"] = analysis.get("primary_keyword")
         self.state["secondary_keywords"] = analysis.get("secondary_keywords", [])
         self.state["title"] = analysis.get("title")
         self.state["outline"] = analysis.get("outline", [])
+        if not failed:
+            self._remember_topic()
         
         return analysis
     
+    async def _summarize_sources(self, force_refresh: bool) -> List[Dict[str, Any]]:
+        """
+        Summarize every long scraped source concurrently.
+        
+        Args:
+            force_refresh: Bypass cached summaries
+            
+        Returns:
+            Copy of the scraped content with long texts replaced by their summaries
+        """
+        sources = self.state["scraped_content"]
+        
+        async with self.ai_handler.open_async_client() as client:
+            async def condense(source: Dict[str, Any]) -> Dict[str, Any]:
+                content = source.get("content", "")
+                if len(content) < SUMMARY_MIN_CHARS:
+                    return source
+                summary = await self.ai_handler.summarize_source(
+                    client,
+                    source.get("url", ""),
+                    content,
+                    force_refresh=force_refresh
+                )
+                return {**source, "content": summary}
+            
+            return await asyncio.gather(*[condense(source) for source in sources])
+    
     def update_content_plan(self, 
                            primary_keyword: Optional[str] = None,
                            secondary_keywords: Optional[List[str]] = None,
@@ -162,16 +423,37 @@ class BlogWriter:
         if outline:
             self.state["outline"] = outline
     
-    def generate_article(self, word_count: int = 1500) -> str:
+    def generate_article(self, word_count: int = 1500, force_refresh: bool = False) -> str:
         """
         Generate the complete article.
         
         Args:
             word_count: Target word count
+            force_refresh: Bypass cached model responses, e.g. when regenerating
             
         Returns:
             Complete article text
         """
+        return "".join(self.generate_article_stream(word_count, force_refresh))
+    
+    def generate_article_stream(self,
+                                word_count: int = 1500,
+                                force_refresh: bool = False) -> Iterator[str]:
+        """
+        Generate the complete article, yielding text as soon as it is available.
+        
+        All outline sections are generated concurrently; text is yielded in
+        outline order, so the section currently being shown streams token by
+        token while later sections finish in the background. The article is
+        stored in state once the stream is exhausted.
+        
+        Args:
+            word_count: Target word count
+            force_refresh: Bypass cached model responses, e.g. when regenerating
+            
+        Returns:
+            Iterator over chunks of the article text
+        """
         if not all([
             self.state["primary_keyword"],
             self.state["secondary_keywords"],
@@ -180,26 +462,102 @@ class BlogWriter:
         ]):
             raise ValueError("Content plan must be complete before generating article")
         
-        # Generate article using AI
-        article = self.ai_handler.generate_article(
-            self.state["topic"],
-            self.state["primary_keyword"],
-            self.state["secondary_keywords"],
-            self.state["title"],
-            self.state["outline"],
-            word_count
-        )
+        loop = asyncio.new_event_loop()
+        failed_sections = []
+        sections = self._stream_sections(word_count, force_refresh, failed_sections)
+        parts = []
+        try:
+            while True:
+                try:
+                    chunk = loop.run_until_complete(sections.__anext__())
+                except StopAsyncIteration:
+                    break
+                parts.append(chunk)
+                yield chunk
+        finally:
+            # Cancels outstanding section requests if the consumer stops early
+            loop.run_until_complete(sections.aclose())
+            loop.close()
         
-        # Store in state
-        self.state["article"] = article
+        # Store in state; an article with failed sections is not remembered
+        self.state["article"] = "".join(parts)
+        if not failed_sections:
+            self._remember_topic()
+    
+    async def _stream_sections(self,
+                               word_count: int,
+                               force_refresh: bool,
+                               failed_sections: List[str]) -> AsyncIterator[str]:
+        """
+        Write every outline section with its own concurrent model call.
         
-        return article
+        Args:
+            word_count: Target word count for the whole article
+            force_refresh: Bypass cached model responses
+            failed_sections: Receives the heading of every section whose model
+                call failed and was replaced by an error message
+            
+        Returns:
+            Async iterator over chunks of the article text, in outline order
+        """
+        outline = self.state["outline"]
+        budgets = apportion_word_count(word_count, outline)
+        
+        async with self.ai_handler.open_async_client() as client:
+            queues = [asyncio.Queue() for _ in outline]
+            
+            async def pump(i: int, heading: str) -> None:
+                try:
+                    async for chunk in self.ai_handler.generate_section_stream(
+                        client,
+                        self.state["topic"],
+                        self.state["primary_keyword"],
+                        self.state["secondary_keywords"],
+                        self.state["title"],
+                        outline,
+                        heading,
+                        outline[i - 1] if i > 0 else "",
+                        budgets[i],
+                        force_refresh=force_refresh,
+                        use_fallback=False
+                    ):
+                        await queues[i].put(chunk)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning("Error generating section '%s': %s", heading, e)
+                    failed_sections.append(heading)
+                    await queues[i].put(self.ai_handler.fallback_section(heading, e))
+                finally:
+                    # Marks the end of the section
+                    await queues[i].put(None)
+            
+            tasks = [
+                asyncio.create_task(pump(i, heading))
+                for i, heading in enumerate(outline)
+            ]
+            try:
+                yield f"# {self.state['title']}"
+                for queue in queues:
+                    yield "\n\n"
+                    while True:
+                        chunk = await queue.get()
+                        if chunk is None:
+                            break
+                        yield chunk
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
     
-    def get_state(self) -> Dict[str, Any]:
+    def get_state(self) -> DiskState:
         """
         Get the current state of the blog writer.
         
+        Values are read from disk when accessed, so nothing is held in memory
+        between Streamlit reruns.
+        
         Returns:
-            Dictionary containing current state
+            Dictionary-like view of the current state
         """
         return self.state
@@ -0,0 +1,95 @@
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator
+import os
+import shutil
+import time
+
+import diskcache
+import orjson
+import zstandard
+
+# Directory holding one state store per blog writer session
+STATE_DIR = "./.state"
+
+# Stores untouched for this long belong to abandoned sessions and are removed
+STATE_TTL = 7 * 24 * 60 * 60
+
+# Bulky text fields stored zstd-compressed
+COMPRESSED_KEYS = frozenset({"scraped_content"})
+COMPRESSION_LEVEL = 3
+
+class DiskState(MutableMapping):
+    """Dictionary-like blog writer state kept on disk rather than in process memory."""
+
+    def __init__(self, session_id: str, state_dir: str = STATE_DIR):
+        """
+        Open (or resume) the state store of a session.
+
+        Args:
+            session_id: Identifier of the session the state belongs to
+            state_dir: Directory under which session stores are created
+        """
+        self.session_id = session_id
+        self._index = diskcache.Index(os.path.join(state_dir, session_id))
+        self._compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._index[key]
+        if key in COMPRESSED_KEYS:
+            value = orjson.loads(self._decompressor.decompress(value))
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in COMPRESSED_KEYS:
+            value = self._compressor.compress(orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS))
+        self._index[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        del self._index[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def close(self) -> None:
+        """Close the underlying database; the state stays on disk for the session to resume."""
+        self._index.cache.close()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Load the whole state into memory.
+
+        Returns:
+            Plain dictionary copy of the state
+        """
+        return dict(self.items())
+
+def sweep_stale_states(state_dir: str = STATE_DIR, ttl: float = STATE_TTL) -> int:
+    """
+    Delete session stores that have not been written to for longer than ttl.
+
+    Args:
+        state_dir: Directory under which session stores are created
+        ttl: Seconds of inactivity after which a store is removed
+
+    Returns:
+        Number of stores removed
+    """
+    if not os.path.isdir(state_dir):
+        return 0
+
+    cutoff = time.time() - ttl
+    removed = 0
+    for entry in os.scandir(state_dir):
+        if not entry.is_dir():
+            continue
+        # diskcache writes to files inside the store, which does not touch the directory itself
+        paths = [entry.path] + [os.path.join(entry.path, name) for name in os.listdir(entry.path)]
+        last_write = max(os.path.getmtime(path) for path in paths)
+        if last_write < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    return removed
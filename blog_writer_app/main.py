@@ -1,17 +1,29 @@
 import streamlit as st
+import logging
 import os
 import sys
 import json
+import re
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
 
 # Add the parent directory to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from core.blog_writer import BlogWriter
+from core.state_store import sweep_stale_states
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Application log level, e.g. LOG_LEVEL=DEBUG to see model inputs and outputs
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+
 # Page configuration
 st.set_page_config(
     page_title="AI Blog Writer",
@@ -20,17 +32,92 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """Thread pool shared by all sessions for long-running research and generation work."""
+    return ThreadPoolExecutor(max_workers=4)
+
+# Session ids are uuid4 hex strings; anything else in the URL is ignored
+SESSION_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+@st.cache_resource
+def sweep_state_stores() -> int:
+    """Remove state stores of long-abandoned sessions, once per server process."""
+    return sweep_stale_states()
+
+def run_research(blog_writer: BlogWriter) -> None:
+    """Research the topic and analyze the results; runs on a worker thread."""
+    blog_writer.perform_research()
+    blog_writer.analyze_content()
+
+def write_article(blog_writer: BlogWriter,
+                  word_count: int,
+                  force_refresh: bool,
+                  chunks: List[str]) -> None:
+    """Generate the article into `chunks` as it streams; runs on a worker thread."""
+    for chunk in blog_writer.generate_article_stream(
+        word_count=word_count,
+        force_refresh=force_refresh
+    ):
+        chunks.append(chunk)
+
+def start_article_job(word_count: int, force_refresh: bool = False) -> None:
+    """Start generating the article in the background."""
+    chunks = []
+    st.session_state.article_job = {
+        "future": get_executor().submit(
+            write_article,
+            st.session_state.blog_writer,
+            word_count,
+            force_refresh,
+            chunks
+        ),
+        "chunks": chunks
+    }
+
+def job_in_flight() -> bool:
+    """Whether a background job is still writing into this session's state."""
+    return "research_future" in st.session_state or "article_job" in st.session_state
+
+def plan_hash(primary_keyword: str,
+              secondary_keywords: List[str],
+              title: str,
+              outline: List[str]) -> int:
+    """Hash a content plan so edits can be detected without comparing field by field."""
+    return hash((primary_keyword, tuple(secondary_keywords), title, tuple(outline)))
+
 def initialize_session_state():
     """Initialize session state variables if they don't exist."""
+    sweep_state_stores()
+    
+    if "session_id" not in st.session_state:
+        # The id is kept in the URL so a reload, or reopening the link, resumes the session
+        session_id = st.query_params.get("session", "")
+        if not SESSION_ID_RE.match(session_id):
+            session_id = uuid.uuid4().hex
+        st.session_state.session_id = session_id
+        st.query_params["session"] = session_id
+    
     if "blog_writer" not in st.session_state:
-        st.session_state.blog_writer = BlogWriter()
+        # Pipeline state lives on disk under the session id, not in session state
+        st.session_state.blog_writer = BlogWriter(session_id=st.session_state.session_id)
     
     if "step" not in st.session_state:
-        st.session_state.step = 1
+        st.session_state.step = resume_step(st.session_state.blog_writer.get_state())
     
     if "show_search_results" not in st.session_state:
         st.session_state.show_search_results = False
 
+def resume_step(state) -> int:
+    """Pick the step to show for a (possibly resumed) session from how far its state got."""
+    if state.get("article"):
+        return 4
+    if state.get("primary_keyword"):
+        return 3
+    if state.get("search_queries"):
+        return 2
+    return 1
+
 def render_header():
     """Render the application header."""
     st.title("🤖 AI Blog Writer")
@@ -50,8 +137,8 @@ def render_topic_input():
         help="Enter a topic for your blog. Be specific for better results."
     )
     
-    # Analyze button
-    if st.button("Research Topic", type="primary") and topic:
+    # Analyze button; a new topic resets state a running job would keep writing into
+    if st.button("Research Topic", type="primary", disabled=job_in_flight()) and topic:
         with st.spinner("Generating search queries..."):
             try:
                 result = st.session_state.blog_writer.process_topic(topic)
@@ -73,21 +160,21 @@ def render_research_results():
     for i, query in enumerate(state['search_queries'], 1):
         st.write(f"{i}. {query}")
     
+    # Surface a failure from the background research job
+    if "research_error" in st.session_state:
+        st.error(f"Error performing research: {st.session_state.pop('research_error')}")
+    
     # Research button
-    if not state.get('scraped_content'):
+    if "research_future" in st.session_state:
+        render_research_progress()
+    elif not state.get('scraped_content'):
         if st.button("Perform Research", type="primary"):
-            with st.spinner("Searching the web and analyzing content... This may take a few minutes."):
-                try:
-                    scraped_content = st.session_state.blog_writer.perform_research()
-                    st.success(f"Research complete! Found {len(scraped_content)} relevant articles.")
-                    
-                    # Automatically proceed to content analysis
-                    with st.spinner("Analyzing content for keywords and structure..."):
-                        analysis = st.session_state.blog_writer.analyze_content()
-                        st.session_state.step = 3
-                        st.rerun()
-                except Exception as e:
-                    st.error(f"Error performing research: {str(e)}")
+            # Research and analysis run on a worker thread so the page stays responsive
+            st.session_state.research_future = get_executor().submit(
+                run_research,
+                st.session_state.blog_writer
+            )
+            st.rerun()
     else:
         st.success(f"Research complete! Found {len(state['scraped_content'])} relevant articles.")
         
@@ -106,6 +193,11 @@ def render_research_results():
         
         # Continue button
         if st.button("Continue to Content Planning", type="primary"):
+            # Analysis already ran after research (or was restored); don't pay for it twice
+            if state.get('primary_keyword'):
+                st.session_state.step = 3
+                st.rerun()
+            
             with st.spinner("Analyzing content for keywords and structure..."):
                 try:
                     analysis = st.session_state.blog_writer.analyze_content()
@@ -114,11 +206,27 @@ def render_research_results():
                 except Exception as e:
                     st.error(f"Error analyzing content: {str(e)}")
     
-    # Option to go back
-    if st.button("Go Back"):
+    # Option to go back, once the research job no longer writes into state
+    if st.button("Go Back", disabled=job_in_flight()):
         st.session_state.step = 1
         st.rerun()
 
+@st.fragment(run_every="1s")
+def render_research_progress():
+    """Poll the background research job and move on to planning once it finishes."""
+    future: Future = st.session_state.research_future
+    if not future.done():
+        st.info("Searching the web and analyzing content... This may take a few minutes.")
+        return
+    
+    del st.session_state.research_future
+    try:
+        future.result()
+        st.session_state.step = 3
+    except Exception as e:
+        st.session_state.research_error = str(e)
+    st.rerun()
+
 def render_content_plan():
     """Render the content plan section."""
     st.header("Step 3: Content Plan")
@@ -165,13 +273,21 @@ def render_content_plan():
     
     # Update and continue button
     if st.button("Update and Continue", type="primary"):
-        # Update content plan
-        st.session_state.blog_writer.update_content_plan(
-            primary_keyword=primary_keyword,
-            secondary_keywords=secondary_keywords,
-            title=title,
-            outline=outline
+        # Only write the plan back when the user actually edited it
+        edited_plan = plan_hash(primary_keyword, secondary_keywords, title, outline)
+        stored_plan = plan_hash(
+            state.get('primary_keyword'),
+            state.get('secondary_keywords', []),
+            state.get('title'),
+            state.get('outline', [])
         )
+        if edited_plan != stored_plan:
+            st.session_state.blog_writer.update_content_plan(
+                primary_keyword=primary_keyword,
+                secondary_keywords=secondary_keywords,
+                title=title,
+                outline=outline
+            )
         st.session_state.step = 4
         st.rerun()
     
@@ -210,16 +326,17 @@ def render_article_generation():
         help="Choose the target word count for your blog post."
     )
     
+    # Surface a failure from the background generation job
+    if "article_error" in st.session_state:
+        st.error(f"Error generating article: {st.session_state.pop('article_error')}")
+    
     # Generate article button
-    if not state.get('article'):
+    if "article_job" in st.session_state:
+        render_article_progress()
+    elif not state.get('article'):
         if st.button("Generate Article", type="primary"):
-            with st.spinner("Generating your blog post... This may take a few minutes."):
-                try:
-                    article = st.session_state.blog_writer.generate_article(word_count=word_count)
-                    st.success("Article successfully generated!")
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Error generating article: {str(e)}")
+            start_article_job(word_count)
+            st.rerun()
     else:
         # Display the generated article
         st.subheader("Generated Article")
@@ -236,18 +353,32 @@ def render_article_generation():
         
         # Regenerate button
         if st.button("Regenerate Article"):
-            with st.spinner("Regenerating your blog post..."):
-                try:
-                    article = st.session_state.blog_writer.generate_article(word_count=word_count)
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Error regenerating article: {str(e)}")
+            start_article_job(word_count, force_refresh=True)
+            st.rerun()
     
-    # Option to go back
-    if st.button("Go Back"):
+    # Option to go back, once the generation job no longer writes into state
+    if st.button("Go Back", disabled=job_in_flight()):
         st.session_state.step = 3
         st.rerun()
 
+@st.fragment(run_every="1s")
+def render_article_progress():
+    """Show the article as it streams in from the background job, then display the result."""
+    job = st.session_state.article_job
+    
+    st.subheader("Generated Article")
+    st.markdown("".join(job["chunks"]) or "Generating your blog post...")
+    if not job["future"].done():
+        return
+    
+    del st.session_state.article_job
+    try:
+        # The job stores the finished article in state
+        job["future"].result()
+    except Exception as e:
+        st.session_state.article_error = str(e)
+    st.rerun()
+
 def render_sidebar():
     """Render the sidebar with progress tracking and settings."""
     with st.sidebar:
@@ -1,32 +1,419 @@
 import openai
+import functools
+import logging
 import os
-from typing import List, Dict, Any
+import hashlib
+import re
+import orjson
+from typing import List, Dict, Any, AsyncIterator, Iterable, Iterator, Optional
 from dotenv import load_dotenv
+import diskcache
+import httpx
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Directory holding cached model responses, shared across app sessions
+LLM_CACHE_DIR = "./.llm_cache"
+
+# How long a cached model response is reused before the model is asked again
+LLM_CACHE_TTL = 7 * 24 * 60 * 60
+
+# Runs of whitespace, collapsed when comparing search queries
+WHITESPACE_RE = re.compile(r"\s+")
+
+def dedupe_queries(queries: List[str]) -> List[str]:
+    """
+    Drop search queries that only differ in case or whitespace, keeping the first of each.
+    
+    Args:
+        queries: Search queries in priority order
+        
+    Returns:
+        The distinct queries, in their original order
+    """
+    seen = set()
+    distinct = []
+    for query in queries:
+        key = WHITESPACE_RE.sub(" ", query.strip().lower())
+        if key not in seen:
+            seen.add(key)
+            distinct.append(query.strip())
+    return distinct
+
+def find_json(text: str) -> Iterator[str]:
+    """
+    Yield each top-level JSON object or array embedded in free text, in one linear pass.
+    
+    Brackets inside JSON strings (including escaped quotes) are ignored; quotes
+    in the surrounding prose are not treated as strings.
+    
+    Args:
+        text: Model response possibly wrapping JSON in extra text
+        
+    Returns:
+        Iterator over candidate JSON snippets, in order of appearance
+    """
+    depth = 0
+    start = -1
+    in_string = False
+    escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = depth > 0
+        elif char in "{[":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif char in "}]" and depth:
+            depth -= 1
+            if depth == 0:
+                yield text[start:i + 1]
+
+# Limits on the scraped text sent to analyze_content, per article and in total
+MAX_ANALYSIS_CHARS_PER_ARTICLE = 4000
+MAX_ANALYSIS_CHARS = 60000
+
+# Cheap embedding model used to match semantically similar topics
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Cheap model that condenses each scraped source before analysis
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_MAX_TOKENS = 500
+
+# Instructions for analyze_content. Kept byte-identical between calls, with the
+# scraped articles at the end of the user message, so the provider's prompt
+# prefix cache covers everything but the variable content.
+ANALYZE_SYSTEM_PROMPT = """You will be given 25 articles, and content for the topic; that rank highly for content about a topic similar to what we are ranking for.
+Your task is to analyse each article one by one; and then find what is the primary keyword for the article. this is the keyword that appears mostly in the title and early phrase of the article.
+further also distinct keywords which appear throughout the article.
+further; also find the outline of the artilce how are headings and subheadings and the pargraphs in it structured.
+
+based on this analysis from the above article provided to you;
+you ened to draft the primary keyword, secondary keywords, title, and outline for our article on the given topic.
+
+make sure your analysis and output is best based on the content provided.
+
+You are a professional content analyzer and SEO expert. Your task is to analyze the
+provided content and extract key information for creating a comprehensive blog post.
+
+Provide your analysis in the following JSON format:
+{
+    "primary_keyword": "the main keyword that appears most frequently across all articles",
+    "secondary_keywords": ["list of 5-10 distinct keywords that appear across articles"],
+    "title": "a compelling title that includes the primary keyword",
+    "outline": ["list of 5-10 hierarchical section headings for a blog post"]
+}
+
+Secondary keywords should be distinct and complementary to the primary keyword.
+The title should be engaging and SEO-friendly, incorporating the primary keyword.
+The outline should provide a clear structure for a 1000-1500 word blog post.
+
+Analyze the scraped articles from the user message to create the primary keyword,
+secondary keywords, a compelling title, and a detailed outline for a blog post on the
+original topic given after them. Return your analysis in the requested JSON format."""
+
+# Structured output schema for analyze_content; the API only returns JSON matching it
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "primary_keyword": {"type": "string"},
+        "secondary_keywords": {"type": "array", "items": {"type": "string"}},
+        "title": {"type": "string"},
+        "outline": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["primary_keyword", "secondary_keywords", "title", "outline"],
+    "additionalProperties": False
+}
+ANALYSIS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "analysis", "strict": True, "schema": ANALYSIS_SCHEMA}
+}
+
+# Instructions for generate_article, static for the same reason
+ARTICLE_SYSTEM_PROMPT = """You are a professional content writer skilled at creating comprehensive, engaging, and
+SEO-optimized blog posts. Your task is to write a complete article based on the provided
+parameters.
+
+Follow these guidelines:
+1. Use the primary keyword naturally throughout the article
+2. Incorporate secondary keywords where relevant
+3. Follow the provided outline structure
+4. Write in a professional, informative, and engaging style
+5. Include an introduction that hooks the reader
+6. Provide practical, actionable information
+7. End with a conclusion that summarizes key points
+8. Format with appropriate headings, subheadings, and paragraphs
+9. Aim for the specified word count
+
+Return only the complete article with proper formatting."""
+
+ARTICLE_USER_PROMPT_HEADER = """Create a well-structured, informative article that follows the outline below and naturally
+incorporates the keywords. The article should be engaging, valuable to readers, and
+optimized for SEO.
+
+Write a comprehensive blog post with the following parameters:
+"""
+
+# Connection pool shared by every AIHandler that talks to the same endpoint
+OPENAI_LIMITS = httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+OPENAI_TIMEOUT = 60.0
+
+@functools.lru_cache(maxsize=None)
+def get_openai_client(api_key: Optional[str], base_url: Optional[str] = None) -> openai.OpenAI:
+    """
+    Get the process-wide OpenAI client for an API key and endpoint.
+    
+    Handlers are created per Streamlit session, so sharing the client keeps
+    connections to the API warm instead of paying a TLS handshake per handler.
+    
+    Args:
+        api_key: OpenAI API key
+        base_url: API endpoint; the library default is used if omitted
+        
+    Returns:
+        Shared OpenAI client
+    """
+    return openai.OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=httpx.Client(limits=OPENAI_LIMITS, timeout=OPENAI_TIMEOUT)
+    )
+
 class AIHandler:
     """Handles interactions with OpenAI language models."""
     
-    def __init__(self, model="o3-mini"):
+    def __init__(self, model="o3-mini", cache_dir=LLM_CACHE_DIR):
         """
         Initialize the AI handler.
         
         Args:
             model: The model to use for generation (default: o3-mini)
+            cache_dir: Directory for the on-disk response cache
         """
         self.api_key = os.getenv("OPENAI_API_KEY")
-        self.client = openai.OpenAI(api_key=self.api_key)
+        self.client = get_openai_client(self.api_key, os.getenv("OPENAI_BASE_URL"))
         self.model = model
+        self.cache = diskcache.Cache(cache_dir)
+    
+    def close(self) -> None:
+        """Close the response cache; the shared OpenAI client stays open for other handlers."""
+        self.cache.close()
+    
+    def _cache_key(self, method: str, messages: List[Dict[str, str]], **params) -> str:
+        """
+        Build the cache key for a chat completion request.
+        
+        Args:
+            method: Name of the calling AIHandler method
+            messages: Chat messages sent to the model
+            **params: Extra request parameters that affect the output (e.g. temperature)
+            
+        Returns:
+            SHA-256 hex digest identifying the request
+        """
+        payload = orjson.dumps(
+            [method, self.model, messages, params],
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        )
+        return hashlib.sha256(payload).hexdigest()
+    
+    def _complete(self,
+                  method: str,
+                  messages: List[Dict[str, str]],
+                  force_refresh: bool = False,
+                  **params) -> str:
+        """
+        Run a chat completion, reusing a cached response for identical requests.
+        
+        Args:
+            method: Name of the calling AIHandler method
+            messages: Chat messages sent to the model
+            force_refresh: Skip the cache lookup and always call the model
+            **params: Extra parameters passed to the completions API
+            
+        Returns:
+            The text content of the model response
+        """
+        key = self._cache_key(method, messages, **params)
+        if not force_refresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.info("Using cached response for %s", method)
+                return cached
+        
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            **params
+        )
+        content = response.choices[0].message.content
+        self._log_usage(method, response.usage)
+        
+        if content:
+            self.cache.set(key, content, expire=LLM_CACHE_TTL)
+        return content
+    
+    async def _stream_async(self,
+                            client: openai.AsyncOpenAI,
+                            method: str,
+                            messages: List[Dict[str, str]],
+                            force_refresh: bool = False,
+                            **params) -> AsyncIterator[str]:
+        """
+        Stream a chat completion token by token, sharing the response cache with _complete.
+        
+        A cached response is yielded as a single chunk; a fresh response is
+        cached once the stream is complete.
+        
+        Args:
+            client: Async OpenAI client bound to the running event loop
+            method: Name of the calling AIHandler method
+            messages: Chat messages sent to the model
+            force_refresh: Skip the cache lookup and always call the model
+            **params: Extra parameters passed to the completions API
+            
+        Returns:
+            Async iterator over text chunks of the model response
+        """
+        key = self._cache_key(method, messages, **params)
+        if not force_refresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.info("Using cached response for %s", method)
+                yield cached
+                return
+        
+        stream = await client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            **params
+        )
+        parts = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+        
+        content = "".join(parts)
+        if content:
+            self.cache.set(key, content, expire=LLM_CACHE_TTL)
+    
+    def _log_usage(self, method: str, usage: Any) -> None:
+        """Log the token usage of a completion at INFO level."""
+        logger.info(
+            "Token usage (%s): prompt %d, completion %d, total %d",
+            method, usage.prompt_tokens, usage.completion_tokens, usage.total_tokens
+        )
+    
+    def open_async_client(self) -> openai.AsyncOpenAI:
+        """
+        Create an async OpenAI client.
+        
+        The client's connection pool is tied to the event loop it is first used
+        on, so open one per asyncio.run and close it with `async with`.
+        
+        Returns:
+            Async OpenAI client
+        """
+        return openai.AsyncOpenAI(api_key=self.api_key)
+    
+    def embed_text(self, text: str) -> Optional[List[float]]:
+        """
+        Embed a short text such as a topic.
+        
+        Args:
+            text: The text to embed
+            
+        Returns:
+            Embedding vector, or None if the request failed
+        """
+        try:
+            response = self.client.embeddings.create(model=EMBEDDING_MODEL, input=text)
+            return response.data[0].embedding
+        except Exception as e:
+            logger.warning("Error embedding text: %s", e)
+            return None
+    
+    async def summarize_source(self,
+                               client: openai.AsyncOpenAI,
+                               url: str,
+                               text: str,
+                               force_refresh: bool = False) -> str:
+        """
+        Condense one scraped source with a cheap model so analysis prompts stay small.
+        
+        Args:
+            client: Async OpenAI client bound to the running event loop
+            url: URL the text was scraped from
+            text: Scraped article text
+            force_refresh: Bypass the summary cache
+            
+        Returns:
+            Summary of at most SUMMARY_MAX_TOKENS tokens, or the original text if summarizing failed
+        """
+        # The URL plus the opening of the text identifies a source cheaply
+        key = self._cache_key(
+            "summarize_source",
+            [{"url": url, "text": text[:256]}],
+            model=SUMMARY_MODEL
+        )
+        if not force_refresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        system_prompt = """
+        You summarize web articles for an SEO analyst. Keep the terms and phrases the article 
+        uses most, its main sections in order, and its key facts. Do not add commentary.
+        """
+        
+        try:
+            response = await client.chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": text}
+                ],
+                max_tokens=SUMMARY_MAX_TOKENS
+            )
+            summary = response.choices[0].message.content
+        except Exception as e:
+            logger.warning("Error summarizing %s: %s", url, e)
+            return text
+        
+        if not summary:
+            return text
+        self.cache.set(key, summary, expire=LLM_CACHE_TTL)
+        return summary
     
-    def generate_search_queries(self, topic: str, num_queries: int = 5) -> List[str]:
+    def generate_search_queries(self,
+                                topic: str,
+                                num_queries: int = 5,
+                                force_refresh: bool = False,
+                                use_fallback: bool = True) -> List[str]:
         """
         Generate search queries based on the topic.
         
         Args:
             topic: The user's input topic
             num_queries: Number of search queries to generate
+            force_refresh: Bypass the response cache
+            use_fallback: Return generic queries when the model call fails;
+                if False the error is raised instead
             
         Returns:
             List of search queries
@@ -37,7 +424,7 @@ class AIHandler:
         Your task is to convert a blog topic into search queries that will return popular, information-rich articles.
         Think step-by-step about what most people would search for when looking for information on this topic.
         
-        Return ONLY a JSON array of strings with no additional explanations or text.
+        Return ONLY a JSON object of the form {"queries": ["query 1", "query 2"]} with no additional explanations or text.
         """
         
         user_prompt = f"""
@@ -50,274 +437,158 @@ class AIHandler:
         4. Consider what beginners would search for to learn about this topic
         5. Add queries that would surface comprehensive, informative articles rather than specific answers
         
-        Return the queries as a JSON array of strings.
+        Return all {num_queries} queries in a single JSON object: {{"queries": [...]}}
         """
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            content = self._complete(
+                "generate_search_queries",
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
+                force_refresh=force_refresh,
                 response_format={"type": "json_object"}
             )
             
             # Extract and return the search queries
-            content = response.choices[0].message.content
             try:
-                queries = eval(content).get("queries", [])
-                if not queries:
+                data = orjson.loads(content)
+            except orjson.JSONDecodeError:
+                # Fall back to the JSON embedded in the text, trying the longest candidate first
+                data = None
+                for candidate in sorted(find_json(content or ""), key=len, reverse=True):
                     try:
-                        # Try to interpret as a direct array
-                        queries = eval(content)
-                    except:
-                        # Fall back to a simple array
-                        return [f"{topic} guide", 
-                                f"{topic} best practices", 
-                                f"how to {topic}", 
-                                f"{topic} tips", 
-                                f"{topic} examples"]
-                
-                return queries[:num_queries]
-            except:
-                # Fallback to a simple search query if JSON parsing fails
-                return [f"{topic} guide", 
-                        f"{topic} best practices", 
-                        f"how to {topic}", 
-                        f"{topic} tips", 
-                        f"{topic} examples"]
+                        data = orjson.loads(candidate)
+                        break
+                    except orjson.JSONDecodeError:
+                        continue
+            
+            queries = data.get("queries") if isinstance(data, dict) else data
+            if not isinstance(queries, list):
+                raise ValueError("Model response contains no list of search queries")
+            
+            # Each query is a paid search, so near-identical ones are dropped
+            queries = dedupe_queries([query for query in queries if isinstance(query, str) and query.strip()])
+            if not queries:
+                raise ValueError("Model returned no usable search queries")
+            return queries[:num_queries]
         except Exception as e:
+            if not use_fallback:
+                raise
             # Provide fallback search queries
-            print(f"Error generating search queries: {e}")
-            return [f"{topic} guide", 
-                    f"{topic} best practices", 
-                    f"how to {topic}", 
-                    f"{topic} tips", 
-                    f"{topic} examples"]
+            logger.warning("Error generating search queries: %s", e)
+            return self.fallback_queries(topic)
+    
+    def fallback_queries(self, topic: str) -> List[str]:
+        """Simple search queries used when the model's queries are unavailable."""
+        return [f"{topic} guide", 
+                f"{topic} best practices", 
+                f"how to {topic}", 
+                f"{topic} tips", 
+                f"{topic} examples"]
     
     def analyze_content(self, 
                         topic: str, 
-                        scraped_content: List[Dict[str, Any]]) -> Dict[str, Any]:
+                        scraped_content: Iterable[Dict[str, Any]],
+                        force_refresh: bool = False,
+                        use_fallback: bool = True) -> Dict[str, Any]:
         """
         Analyze scraped content to extract primary keyword, secondary keywords,
         title, and outline.
         
         Args:
             topic: The original topic
-            scraped_content: List of dictionaries containing scraped content
+            scraped_content: Dictionaries containing scraped content; any iterable
+                is accepted and consumed in a single pass
+            force_refresh: Bypass the response cache
+            use_fallback: Return a generic analysis when the model call fails;
+                if False the error is raised instead
             
         Returns:
             Dictionary with primary keyword, secondary keywords, title, and outline
         """
-        # Prepare content for analysis
-        combined_content = ""
+        # Prepare content for analysis, joining the pieces once at the end
+        parts = []
+        total_chars = 0
+        truncated = 0
         for i, article in enumerate(scraped_content, 1):
             if 'content' in article and article['content']:
+                if total_chars >= MAX_ANALYSIS_CHARS:
+                    logger.info(
+                        "Analysis input reached %d characters; skipping articles from %d on",
+                        MAX_ANALYSIS_CHARS, i
+                    )
+                    break
+                
                 # Add article number and content with separator
-                combined_content += f"--- Article {i} ---\n\n"
-                combined_content += article['content']  # Include full content
-                combined_content += "\n\n"
+                text = article['content'][:MAX_ANALYSIS_CHARS_PER_ARTICLE]
+                if len(text) < len(article['content']):
+                    truncated += 1
+                parts.append(f"--- Article {i} ---\n\n")
+                parts.append(text)
+                parts.append("\n\n")
+                total_chars += len(text)
                 
                 # Add headings
                 if 'headings' in article and article['headings']:
-                    combined_content += "Headings:\n"
+                    parts.append("Headings:\n")
                     for heading in article['headings'][:10]:
-                        combined_content += f"- {heading.get('text', '')}\n"
-                    combined_content += "\n\n"
+                        parts.append(f"- {heading.get('text', '')}\n")
+                    parts.append("\n\n")
+        combined_content = "".join(parts)
+        if truncated:
+            logger.info("Truncated %d articles to %d characters for analysis", truncated, MAX_ANALYSIS_CHARS_PER_ARTICLE)
         
-        # # Truncate if too long
-        # if len(combined_content) > 15000:
-        #     combined_content = combined_content[:15000] + "... [content truncated]"
+        logger.debug("Combined content length: %d characters", len(combined_content))
         
-        # Print the combined content length for debugging
-        print(f"\n\nCOMBINED CONTENT LENGTH: {len(combined_content)} characters")
-        
-        system_prompt = """
-        You will be given 25 articles, and content for the topic; that rank highly for content about a topic similar to what we are ranking for.
-        Your task is to analyse each article one by one; and then find what is the primary keyword for the article. this is the keyword that appears mostly in the title and early phrase of the article.
-        further also distinct keywords which appear throughout the article.
-        further; also find the outline of the artilce how are headings and subheadings and the pargraphs in it structured.
-
-        based on this analysis from the above article provided to you; 
-        you ened to draft the primary keyword, secondary keywords, title, and outline for our article on the given topic.
-
-        make sure your analysis and output is best based on the content provided.
-
-
-        You are a professional content analyzer and SEO expert. Your task is to analyze the 
-        provided content and extract key information for creating a comprehensive blog post.
-        
-        Provide your analysis in the following JSON format:
-        {
-            "primary_keyword": "the main keyword that appears most frequently across all articles",
-            "secondary_keywords": ["list of 5-10 distinct keywords that appear across articles"],
-            "title": "a compelling title that includes the primary keyword",
-            "outline": ["list of 5-10 hierarchical section headings for a blog post"]
-        }
-        
-        Secondary keywords should be distinct and complementary to the primary keyword.
-        The title should be engaging and SEO-friendly, incorporating the primary keyword.
-        The outline should provide a clear structure for a 1000-1500 word blog post.
-        """
-        
-        # Print the system prompt for debugging
-        print("\n\nSYSTEM PROMPT:")
-        print(system_prompt)
-        
-        user_prompt = f"""
-        Original topic: {topic}
-        
-        Analyze the following scraped content from multiple articles to create the primary keyword, 
-        secondary keywords, a compelling title, and a detailed outline for a blog post:
-        
-        {combined_content}
-        
-        Return your analysis in the requested JSON format.
-        """
-        
-        # Print the user prompt for debugging
-        print("\n\nUSER PROMPT:")
-        print(f"Original topic: {topic}")
-        print("[Content truncated for readability]")
+        # Static instructions come first so repeated calls share a cacheable prompt prefix
+        user_prompt = (
+            "Analyze these articles:\n\n"
+            + combined_content
+            + f"\nOriginal topic: {topic}\n"
+        )
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
+            content = self._complete(
+                "analyze_content",
+                [
+                    {"role": "system", "content": ANALYZE_SYSTEM_PROMPT},
                     {"role": "user", "content": user_prompt}
                 ],
-                response_format={"type": "json_object"}
+                force_refresh=force_refresh,
+                response_format=ANALYSIS_RESPONSE_FORMAT
             )
             
-            # Extract and print the raw response for debugging
-            content = response.choices[0].message.content
-            print("\n\nRAW MODEL OUTPUT:")
-            print(content)
-            print("\n\nEND OF RAW MODEL OUTPUT")
-            
-            # Print the token usage for debugging
-            print(f"\n\nTOKEN USAGE:")
-            print(f"Prompt tokens: {response.usage.prompt_tokens}")
-            print(f"Completion tokens: {response.usage.completion_tokens}")
-            print(f"Total tokens: {response.usage.total_tokens}")
+            # Dump the raw response for debugging; skipped entirely unless DEBUG is enabled
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Raw analysis output:\n%s", content)
             
-            # Advanced parsing with multiple fallback methods
-            import json
-            import re
-            
-            # Method 1: Try direct JSON parsing
-            try:
-                analysis = json.loads(content)
-                print("Successfully parsed with direct json.loads")
-                return analysis
-            except json.JSONDecodeError as e:
-                print(f"Direct JSON parsing failed: {e}")
-            
-            # Method 2: Try to extract JSON from markdown code blocks
-            try:
-                if "```json" in content and "```" in content.split("```json")[1]:
-                    json_content = content.split("```json")[1].split("```")[0].strip()
-                    analysis = json.loads(json_content)
-                    print("Successfully parsed JSON from markdown code block")
-                    return analysis
-            except Exception as e:
-                print(f"Markdown code block extraction failed: {e}")
-                
-            # Method 3: Use regex to find JSON object
-            try:
-                # Find anything that looks like a JSON object
-                json_pattern = r'\{[^\{\}]*((\{[^\{\}]*\})[^\{\}]*)*\}'
-                matches = re.findall(json_pattern, content)
-                if matches:
-                    # Take the longest match as it's likely the complete JSON
-                    json_str = max(re.findall(json_pattern, content), key=len)
-                    analysis = json.loads(json_str)
-                    print("Successfully parsed with regex extraction")
-                    return analysis
-            except Exception as e:
-                print(f"Regex extraction failed: {e}")
-            
-            # Method 4: Manual extraction of key components
-            try:
-                # Try to extract components individually
-                primary_keyword = re.search(r'"primary_keyword"\s*:\s*"([^"]+)"', content)
-                primary_keyword = primary_keyword.group(1) if primary_keyword else topic
-                
-                # Extract secondary keywords array
-                secondary_keywords_match = re.search(r'"secondary_keywords"\s*:\s*\[(.*?)\]', content, re.DOTALL)
-                if secondary_keywords_match:
-                    keywords_str = secondary_keywords_match.group(1)
-                    # Extract quoted strings
-                    secondary_keywords = re.findall(r'"([^"]+)"', keywords_str)
-                else:
-                    secondary_keywords = [topic + " guide", topic + " tips", "how to " + topic]
-                
-                # Extract title
-                title_match = re.search(r'"title"\s*:\s*"([^"]+)"', content)
-                title = title_match.group(1) if title_match else f"Complete Guide to {topic.title()}"
-                
-                # Extract outline array
-                outline_match = re.search(r'"outline"\s*:\s*\[(.*?)\]', content, re.DOTALL)
-                if outline_match:
-                    outline_str = outline_match.group(1)
-                    outline = re.findall(r'"([^"]+)"', outline_str)
-                else:
-                    outline = [
-                        f"Introduction to {topic}",
-                        f"Why {topic} is Important",
-                        f"Key Benefits of {topic}",
-                        f"How to Get Started with {topic}",
-                        f"Best Practices for {topic}",
-                        f"Common Challenges and Solutions",
-                        f"Conclusion"
-                    ]
-                
-                analysis = {
-                    "primary_keyword": primary_keyword,
-                    "secondary_keywords": secondary_keywords,
-                    "title": title,
-                    "outline": outline
-                }
-                print("Successfully extracted components with regex")
-                return analysis
-            except Exception as e:
-                print(f"Manual extraction failed: {e}")
-            
-            # Final fallback
-            print("All parsing methods failed, using default values")
-            return {
-                "primary_keyword": topic,
-                "secondary_keywords": [topic + " guide", topic + " tips", "how to " + topic],
-                "title": f"Complete Guide to {topic.title()}: Everything You Need to Know",
-                "outline": [
-                    f"Introduction to {topic}",
-                    f"Why {topic} is Important",
-                    f"Key Benefits of {topic}",
-                    f"How to Get Started with {topic}",
-                    f"Best Practices for {topic}",
-                    f"Common Challenges and Solutions",
-                    f"Conclusion"
-                ]
-            }
+            # Structured outputs guarantee the content matches ANALYSIS_SCHEMA
+            return orjson.loads(content)
         except Exception as e:
+            if not use_fallback:
+                raise
             # Provide fallback analysis
-            print(f"Error analyzing content: {e}")
-            return {
-                "primary_keyword": topic,
-                "secondary_keywords": [topic + " guide", topic + " tips", "how to " + topic],
-                "title": f"Complete Guide to {topic.title()}: Everything You Need to Know",
-                "outline": [
-                    f"Introduction to {topic}",
-                    f"Why {topic} is Important",
-                    f"Key Benefits of {topic}",
-                    f"How to Get Started with {topic}",
-                    f"Best Practices for {topic}",
-                    f"Common Challenges and Solutions",
-                    f"Conclusion"
-                ]
-            }
+            logger.warning("Error analyzing content: %s", e)
+            return self.fallback_analysis(topic)
+    
+    def fallback_analysis(self, topic: str) -> Dict[str, Any]:
+        """Build a generic analysis used when the model call fails."""
+        return {
+            "primary_keyword": topic,
+            "secondary_keywords": [topic + " guide", topic + " tips", "how to " + topic],
+            "title": f"Complete Guide to {topic.title()}: Everything You Need to Know",
+            "outline": [
+                f"Introduction to {topic}",
+                f"Why {topic} is Important",
+                f"Key Benefits of {topic}",
+                f"How to Get Started with {topic}",
+                f"Best Practices for {topic}",
+                f"Common Challenges and Solutions",
+                f"Conclusion"
+            ]
+        }
     
     def generate_article(self, 
                          topic: str,
@@ -325,9 +596,10 @@ class AIHandler:
                          secondary_keywords: List[str],
                          title: str,
                          outline: List[str],
-                         word_count: int = 1500) -> str:
+                         word_count: int = 1500,
+                         force_refresh: bool = False) -> str:
         """
-        Generate a complete article based on the provided parameters.
+        Generate a complete article in a single request.
         
         Args:
             topic: The original topic
@@ -336,58 +608,124 @@ class AIHandler:
             title: The article title
             outline: The article outline
             word_count: Target word count (default: 1500)
+            force_refresh: Bypass the response cache, e.g. when regenerating
             
         Returns:
             Complete article text
         """
+        # Static instructions come first so repeated calls share a cacheable prompt prefix
+        user_prompt = ARTICLE_USER_PROMPT_HEADER + f"""
+Topic: {topic}
+Title: {title}
+Primary Keyword: {primary_keyword}
+Secondary Keywords: {', '.join(secondary_keywords)}
+Target Word Count: {word_count} words
+
+Outline:
+{chr(10).join('- ' + item for item in outline)}
+"""
+        
+        try:
+            return self._complete(
+                "generate_article",
+                [
+                    {"role": "system", "content": ARTICLE_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt}
+                ],
+                force_refresh=force_refresh
+            )
+        except Exception as e:
+            # Provide a fallback message
+            logger.warning("Error generating article: %s", e)
+            return f"Error generating article: {str(e)}"
+    
+    async def generate_section_stream(self,
+                                      client: openai.AsyncOpenAI,
+                                      topic: str,
+                                      primary_keyword: str,
+                                      secondary_keywords: List[str],
+                                      title: str,
+                                      outline: List[str],
+                                      section_heading: str,
+                                      prior_section_summary: str,
+                                      section_word_budget: int,
+                                      force_refresh: bool = False,
+                                      use_fallback: bool = True) -> AsyncIterator[str]:
+        """
+        Generate a single section of the article, streaming text as it is produced.
+        
+        Sections are written concurrently, so every request carries the same
+        preamble (topic, title, keywords and full outline) to keep them consistent.
+        
+        Args:
+            client: Async OpenAI client bound to the running event loop
+            topic: The original topic
+            primary_keyword: The main keyword for the article
+            secondary_keywords: List of secondary keywords
+            title: The article title
+            outline: The complete article outline
+            section_heading: The outline item to write
+            prior_section_summary: What the preceding section covers, empty for the first section
+            section_word_budget: Target word count for this section
+            force_refresh: Bypass the response cache, e.g. when regenerating
+            use_fallback: End the section with an error message when the model
+                call fails; if False the error is raised instead
+            
+        Returns:
+            Async iterator over chunks of the section text, which starts with its heading
+        """
         system_prompt = """
         You are a professional content writer skilled at creating comprehensive, engaging, and 
-        SEO-optimized blog posts. Your task is to write a complete article based on the provided 
-        parameters.
+        SEO-optimized blog posts. Several writers are each drafting one section of the same 
+        article at the same time; you are writing exactly one of those sections.
         
         Follow these guidelines:
-        1. Use the primary keyword naturally throughout the article
+        1. Use the primary keyword naturally where it fits
         2. Incorporate secondary keywords where relevant
-        3. Follow the provided outline structure
+        3. Cover only your section; do not repeat material that belongs to other outline items
         4. Write in a professional, informative, and engaging style
-        5. Include an introduction that hooks the reader
-        6. Provide practical, actionable information
-        7. End with a conclusion that summarizes key points
-        8. Format with appropriate headings, subheadings, and paragraphs
-        9. Aim for the specified word count
+        5. Provide practical, actionable information
+        6. Start with the section heading as a level-2 markdown heading (## Heading)
+        7. Use level-3 subheadings and paragraphs as needed
+        8. Aim for the specified word count
         
-        Return only the complete article with proper formatting.
+        Return only the section text with proper formatting.
         """
         
         user_prompt = f"""
-        Write a comprehensive blog post with the following parameters:
+        Article context shared by all sections:
         
         Topic: {topic}
         Title: {title}
         Primary Keyword: {primary_keyword}
         Secondary Keywords: {', '.join(secondary_keywords)}
-        Target Word Count: {word_count} words
         
-        Outline:
+        Full outline:
         {chr(10).join('- ' + item for item in outline)}
         
-        Create a well-structured, informative article that follows this outline and naturally 
-        incorporates the keywords. The article should be engaging, valuable to readers, and 
-        optimized for SEO.
+        Write only this section: {section_heading}
+        Preceding section: {prior_section_summary or "none, this section opens the article"}
+        Target Word Count: {section_word_budget} words
         """
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            async for chunk in self._stream_async(
+                client,
+                "generate_section",
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
-                ]
-            )
-            
-            # Return the generated article
-            return response.choices[0].message.content
+                ],
+                force_refresh=force_refresh
+            ):
+                yield chunk
         except Exception as e:
+            if not use_fallback:
+                raise
             # Provide a fallback message
-            print(f"Error generating article: {e}")
-            return f"Error generating article: {str(e)}"
+            logger.warning("Error generating section '%s': %s", section_heading, e)
+            yield self.fallback_section(section_heading, e)
+    
+    def fallback_section(self, section_heading: str, error: Exception) -> str:
+        """Build the text shown in place of a section whose model call failed."""
+        return f"\n\n## {section_heading}\n\nError generating section: {str(error)}"
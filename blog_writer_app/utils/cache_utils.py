@@ -0,0 +1,253 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+import orjson
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the database of topic embeddings and the state saved for each topic
+SEMANTIC_CACHE_DIR = "./.sem_cache"
+
+# Minimum cosine similarity for two topics to be treated as the same request
+SIMILARITY_THRESHOLD = 0.92
+
+# How long a saved topic is reused before its pipeline is run again
+SEMANTIC_CACHE_TTL = 7 * 24 * 60 * 60
+
+# SQLite database holding parsed pages, shared across app sessions
+SCRAPE_CACHE_PATH = "./.scrape_cache/pages.db"
+
+# How long a scraped page is reused before it is downloaded again
+SCRAPE_CACHE_TTL = 7 * 24 * 60 * 60
+
+class SemanticCache:
+    """Reuses saved pipeline state for topics that are worded differently but mean the same."""
+
+    def __init__(self,
+                 cache_dir: str = SEMANTIC_CACHE_DIR,
+                 threshold: float = SIMILARITY_THRESHOLD,
+                 ttl: float = SEMANTIC_CACHE_TTL):
+        """
+        Open (or create) the cache database shared by all sessions.
+
+        Args:
+            cache_dir: Directory where embeddings and state snapshots are persisted
+            threshold: Minimum cosine similarity for a lookup to count as a hit
+            ttl: Seconds after which a saved topic no longer counts as a hit and is deleted
+        """
+        self.threshold = threshold
+        self.ttl = ttl
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # One row per topic, so concurrent sessions never overwrite each other's topics;
+        # the lock serialises this handler's threads on the connection
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "topics.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS topics "
+            "(id INTEGER PRIMARY KEY, saved_at REAL, embedding BLOB, state BLOB)"
+        )
+        self._conn.commit()
+        self._compressor = zstandard.ZstdCompressor(level=3)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def lookup(self, embedding: List[float]) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """
+        Find the saved state of the most similar previous topic.
+
+        Only embeddings are read to find the match; the state snapshot is
+        loaded for the matching topic alone.
+
+        Args:
+            embedding: Embedding of the new topic
+
+        Returns:
+            Tuple of (entry id, saved state) if a topic is similar enough, otherwise None
+        """
+        query = self._normalize(embedding)
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, embedding FROM topics WHERE saved_at > ?",
+                    (time.time() - self.ttl,)
+                ).fetchall()
+            rows = [(entry_id, blob) for entry_id, blob in rows if len(blob) == query.nbytes]
+            if not rows:
+                return None
+
+            # Rows are unit length, so the inner product is the cosine similarity
+            embeddings = np.frombuffer(b"".join(blob for _, blob in rows), dtype=np.float32)
+            scores = embeddings.reshape(len(rows), -1) @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            entry_id = rows[best][0]
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT state FROM topics WHERE id = ?", (entry_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                state = orjson.loads(self._decompressor.decompress(row[0]))
+        except Exception as e:
+            logger.warning("Error reading semantic cache: %s", e)
+            return None
+
+        logger.info("Semantic cache hit (similarity %.3f)", scores[best])
+        return entry_id, state
+
+    def put(self,
+            embedding: List[float],
+            state: Dict[str, Any],
+            entry_id: Optional[int] = None) -> Optional[int]:
+        """
+        Save the state for a topic.
+
+        Args:
+            embedding: Embedding of the topic
+            state: Pipeline state to reuse for similar topics
+            entry_id: Existing entry to overwrite; a new entry is added if omitted
+
+        Returns:
+            Id of the entry that was written, or None if it could not be saved
+        """
+        try:
+            vector = self._normalize(embedding)
+            with self._lock:
+                payload = self._compressor.compress(orjson.dumps(state, option=orjson.OPT_NON_STR_KEYS))
+                cursor = None
+                if entry_id is not None:
+                    cursor = self._conn.execute(
+                        "UPDATE topics SET saved_at = ?, embedding = ?, state = ? WHERE id = ?",
+                        (time.time(), vector.tobytes(), payload, entry_id)
+                    )
+                if cursor is None or cursor.rowcount == 0:
+                    cursor = self._conn.execute(
+                        "INSERT INTO topics (saved_at, embedding, state) VALUES (?, ?, ?)",
+                        (time.time(), vector.tobytes(), payload)
+                    )
+                    entry_id = cursor.lastrowid
+
+                # Expired topics never match again, so drop them rather than let the table grow
+                self._conn.execute(
+                    "DELETE FROM topics WHERE saved_at <= ?", (time.time() - self.ttl,)
+                )
+                self._conn.commit()
+            return entry_id
+        except Exception as e:
+            logger.warning("Error saving semantic cache: %s", e)
+            return None
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _normalize(self, embedding: List[float]) -> np.ndarray:
+        """Convert an embedding to a unit-length float32 vector."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+class ScrapeCache:
+    """Keeps parsed pages on disk so a URL is not downloaded and parsed again on every run."""
+
+    def __init__(self, path: str = SCRAPE_CACHE_PATH, ttl: float = SCRAPE_CACHE_TTL):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: SQLite database file
+            ttl: Seconds after which a cached page is considered stale and is deleted
+        """
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # Pages are read on the event loop and written from parser threads; the
+        # lock serialises use of the one SQLite connection between them
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (url_hash TEXT PRIMARY KEY, ts INTEGER, payload BLOB)"
+        )
+        self._conn.commit()
+
+        # zstandard (de)compressors are not thread-safe, so each thread gets its own
+        self._codecs = threading.local()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a fresh cached page.
+
+        Args:
+            url: URL the page was fetched from
+
+        Returns:
+            The scraped page, or None if it is missing or stale
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT ts, payload FROM cache WHERE url_hash = ?", (self._hash(url),)
+                ).fetchone()
+            if row is None or time.time() - row[0] >= self.ttl:
+                return None
+            return orjson.loads(self._decompressor().decompress(row[1]))
+        except Exception as e:
+            logger.warning("Error reading scrape cache: %s", e)
+            return None
+
+    def put(self, url: str, page: Dict[str, Any]) -> None:
+        """
+        Save a scraped page.
+
+        Args:
+            url: URL the page was fetched from
+            page: Scraped page to reuse on later runs
+        """
+        try:
+            payload = self._compressor().compress(orjson.dumps(page))
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (url_hash, ts, payload) VALUES (?, ?, ?)",
+                    (self._hash(url), int(time.time()), payload)
+                )
+
+                # Stale pages are never served again, so drop them rather than let the table grow
+                self._conn.execute("DELETE FROM cache WHERE ts <= ?", (time.time() - self.ttl,))
+                self._conn.commit()
+        except Exception as e:
+            logger.warning("Error writing scrape cache: %s", e)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _compressor(self) -> zstandard.ZstdCompressor:
+        """Return the calling thread's compressor."""
+        compressor = getattr(self._codecs, "compressor", None)
+        if compressor is None:
+            compressor = self._codecs.compressor = zstandard.ZstdCompressor(level=3)
+        return compressor
+
+    def _decompressor(self) -> zstandard.ZstdDecompressor:
+        """Return the calling thread's decompressor."""
+        decompressor = getattr(self._codecs, "decompressor", None)
+        if decompressor is None:
+            decompressor = self._codecs.decompressor = zstandard.ZstdDecompressor()
+        return decompressor
+
+    def _hash(self, url: str) -> str:
+        """Key a URL by its SHA-256 digest."""
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
@@ -1,24 +1,204 @@
+import asyncio
+import logging
+import time
 import requests
+import aiohttp
+import httpx
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 import json
-from typing import List, Dict, Any, Optional
-from bs4 import BeautifulSoup
+from typing import List, Dict, Any, Optional, Tuple
+from bs4 import BeautifulSoup, SoupStrainer
 import os
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from dotenv import load_dotenv
 
+from utils.cache_utils import ScrapeCache
+
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Browser-like headers so article hosts serve the regular page
+SCRAPE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# Only the tags content extraction looks at are built into the parse tree;
+# scripts, styles, forms and the like are skipped by the parser
+CONTENT_STRAINER = SoupStrainer(["title", "article", "main", "div", "p", "h1", "h2", "h3"])
+
+# Classes marking a div as the main content when there is no article or main tag
+CONTENT_DIV_CLASSES = frozenset({"content", "post", "entry", "article"})
+HEADING_TAGS = frozenset({"h1", "h2", "h3"})
+
+# Page bodies beyond this size are truncated rather than downloaded and parsed in full
+MAX_SCRAPE_BYTES = 2 * 1024 * 1024
+SCRAPE_CHUNK_BYTES = 64 * 1024
+
+# Connection pool for async searches; over HTTP/2 all queries share one connection to Serper
+SEARCH_LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=100)
+SEARCH_TIMEOUT = 15.0
+
+# Upper bound on threads used to run searches in parallel
+MAX_SEARCH_WORKERS = 32
+
+# Hard cap on a single async scrape, so one slow page cannot hold up research
+SCRAPE_TIMEOUT = 8.0
+
+# Minimum spacing between requests to the same host; other hosts proceed in parallel
+MIN_HOST_INTERVAL = 0.2
+
+# Per-host overrides of MIN_HOST_INTERVAL, e.g. for hosts that rate-limit aggressively
+HOST_MIN_INTERVALS: Dict[str, float] = {
+    # Serper is a search API with its own quota, not a site to be polite to
+    "google.serper.dev": 0.0
+}
+
+# Consecutive failures after which a host is skipped, and for how long
+HOST_FAILURE_LIMIT = 3
+HOST_BLOCK_SECONDS = 60
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = frozenset({"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid"})
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalize a URL so the same page reached from different searches compares equal.
+    
+    Lower-cases the scheme and host, drops the fragment and removes tracking
+    query parameters such as utm_*.
+    
+    Args:
+        url: The URL to normalize
+        
+    Returns:
+        Canonical form of the URL
+    """
+    parts = urlsplit(url.strip())
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ]
+    return urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        parts.path,
+        urlencode(query),
+        ""
+    ))
+
+# Hosts whose pages are video, social or paywalled and rarely yield article text
+BLOCKED_HOSTS = frozenset({
+    "youtube.com", "youtu.be", "vimeo.com", "tiktok.com",
+    "twitter.com", "x.com", "linkedin.com", "facebook.com", "instagram.com", "pinterest.com",
+    "wsj.com", "ft.com", "bloomberg.com", "nytimes.com"
+})
+
+# File types that are expensive to download and cannot be parsed as HTML
+BLOCKED_EXTENSIONS = (".pdf", ".mp4", ".mov", ".mp3", ".zip", ".doc", ".docx", ".ppt", ".pptx", ".xls", ".xlsx")
+
+# Whole path segments marking account, shopping or other non-article pages; matched
+# per segment so articles like /cartoon-drawing-tips or /signup-form-examples are kept
+LOW_VALUE_SEGMENTS = frozenset({"login", "signin", "signup", "register", "cart", "checkout"})
+
+def is_scrapable_url(url: str) -> bool:
+    """
+    Cheaply decide from the URL alone whether a page is worth downloading.
+    
+    Args:
+        url: The URL to check
+        
+    Returns:
+        False for blocked hosts (including their subdomains), binary files and
+        low-value pages, True otherwise
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    
+    # Check the host and each parent domain, e.g. m.youtube.com -> youtube.com
+    labels = host.split(".")
+    if any(".".join(labels[i:]) in BLOCKED_HOSTS for i in range(len(labels) - 1)):
+        return False
+    
+    path = parts.path.lower()
+    if path.endswith(BLOCKED_EXTENSIONS):
+        return False
+    
+    return LOW_VALUE_SEGMENTS.isdisjoint(path.split("/"))
+
+def is_html_content_type(content_type: str) -> bool:
+    """
+    Check whether a Content-Type header describes a page worth parsing.
+    
+    Args:
+        content_type: Value of the Content-Type header, possibly empty
+        
+    Returns:
+        True for HTML and XHTML, and for responses that do not declare a type
+    """
+    return not content_type or "html" in content_type.lower()
+
+def create_http_session(pool_size: int = 64) -> requests.Session:
+    """
+    Create a requests session whose kept-alive connections are reused across calls
+    and which retries rate-limited or failed requests with backoff.
+    
+    Args:
+        pool_size: Number of hosts to pool and connections kept per host
+        
+    Returns:
+        Configured requests session
+    """
+    session = requests.Session()
+    # Serper searches are POSTs but idempotent, so they are retried like page GETs
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "POST"]
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 class SearchHandler:
     """Handles web search and content scraping."""
     
-    def __init__(self):
-        """Initialize the search handler with Serper API key."""
+    def __init__(self,
+                 session: Optional[requests.Session] = None,
+                 scrape_cache: Optional[ScrapeCache] = None):
+        """
+        Initialize the search handler with Serper API key.
+        
+        Args:
+            session: Shared HTTP session to issue requests on; a pooled one is created if omitted
+            scrape_cache: Store of previously scraped pages; the default on-disk cache is used if omitted
+        """
+        self.session = session or create_http_session()
+        self.scrape_cache = scrape_cache or ScrapeCache()
         self.api_key = os.getenv("SERPER_API_KEY")
         self.headers = {
             "X-API-KEY": self.api_key,
             "Content-Type": "application/json"
         }
         self.serper_url = "https://google.serper.dev/search"
+        
+        # Time of the latest request slot handed out per host
+        self._host_last_call: Dict[str, float] = {}
+        
+        # Circuit breaker state for misbehaving hosts
+        self._host_failures: Dict[str, int] = {}
+        self._blocked_hosts: Dict[str, float] = {}
+    
+    def close(self) -> None:
+        """Close the underlying HTTP session and the scrape cache."""
+        self.session.close()
+        self.scrape_cache.close()
     
     def search_web(
         self,
@@ -47,40 +227,125 @@ class SearchHandler:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 self.serper_url,
                 headers=self.headers,
                 json=payload
             )
             response.raise_for_status()
-            search_results = response.json()
+            return self._extract_results(response.json())
+        except requests.RequestException as e:
+            logger.warning("Error performing search: %s", e)
+            return []
+    
+    def search_web_batch(self, queries: List[str], **search_kwargs) -> List[List[Dict[str, Any]]]:
+        """
+        Perform several web searches in parallel over the shared session.
+        
+        Args:
+            queries: The search queries
+            **search_kwargs: Extra arguments passed to search_web for every query
             
-            # Extract organic results and add better error handling
-            organic_results = search_results.get("organic", [])
-            results = []
+        Returns:
+            List of search results for each query, in the order of queries
+        """
+        if not queries:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=min(len(queries), MAX_SEARCH_WORKERS)) as executor:
+            return list(executor.map(lambda query: self.search_web(query, **search_kwargs), queries))
+    
+    def open_async_client(self) -> httpx.AsyncClient:
+        """
+        Create an HTTP/2 client for search_web_async.
+        
+        The client is bound to the event loop it is used on, so open one per
+        asyncio.run and close it (or use it as an async context manager) afterwards.
+        
+        Returns:
+            Async HTTP client that multiplexes concurrent searches over one connection
+        """
+        return httpx.AsyncClient(http2=True, limits=SEARCH_LIMITS, timeout=SEARCH_TIMEOUT)
+    
+    async def search_web_async(
+        self,
+        client: httpx.AsyncClient,
+        query: str,
+        country: str = "us",
+        language: str = "en",
+        num_results: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Perform a web search using the Serper.dev API without blocking the event loop.
+        
+        Args:
+            client: Client from open_async_client to issue the request on
+            query: The search query
+            country: Country code for localized results
+            language: Language code
+            num_results: Number of results to return
             
-            if organic_results is None:
-                print(f"Warning: No organic results found in search response: {search_results}")
-                return []
-                
-            for result in organic_results:
-                if result is None:
-                    continue
-                    
-                link = result.get("link", "")
-                if not link:  # Skip results without a link
-                    continue
-                    
-                results.append({
-                    "title": result.get("title", ""),
-                    "link": link,
-                    "snippet": result.get("snippet", "")
-                })
+        Returns:
+            List of dictionaries containing search results
+        """
+        # httpx rejects a None header value, so a missing key is reported here instead
+        if not self.api_key:
+            logger.error("Error performing search: SERPER_API_KEY is not set")
+            return []
+        
+        payload = {
+            "q": query,
+            "gl": country,
+            "hl": language,
+            "num": num_results
+        }
+        
+        try:
+            await self._throttle(self.serper_url)
+            response = await client.post(
+                self.serper_url,
+                headers=self.headers,
+                json=payload
+            )
+            response.raise_for_status()
+            return self._extract_results(response.json())
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning("Error performing search: %s", e)
+            return []
+    
+    def _extract_results(self, search_results: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Extract organic results from a Serper.dev response.
+        
+        Args:
+            search_results: Decoded JSON response from Serper.dev
             
-            return results
-        except requests.RequestException as e:
-            print(f"Error performing search: {str(e)}")
+        Returns:
+            List of dictionaries containing search results
+        """
+        # Extract organic results and add better error handling
+        organic_results = search_results.get("organic", [])
+        results = []
+        
+        if organic_results is None:
+            logger.warning("No organic results found in search response: %s", search_results)
             return []
+            
+        for result in organic_results:
+            if result is None:
+                continue
+                
+            link = result.get("link", "")
+            if not link:  # Skip results without a link
+                continue
+                
+            results.append({
+                "title": result.get("title", ""),
+                "link": link,
+                "snippet": result.get("snippet", "")
+            })
+        
+        return results
     
     def scrape_content(self, url: str) -> Dict[str, Any]:
         """
@@ -92,71 +357,220 @@ class SearchHandler:
         Returns:
             Dictionary containing scraped content
         """
+        cached = self.scrape_cache.get(url)
+        if cached is not None:
+            return cached
+        
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
+            # Stream the body so non-HTML responses and oversized pages are never downloaded in full
+            with self.session.get(url, headers=SCRAPE_HEADERS, timeout=10, stream=True) as response:
+                response.raise_for_status()
+                content_type = response.headers.get("Content-Type", "")
+                if not is_html_content_type(content_type):
+                    return self._error_result(url, f"Unsupported content type: {content_type}")
+                body = response.raw.read(MAX_SCRAPE_BYTES, decode_content=True)
+                charset = self._declared_charset(response)
+            return self._parse_and_cache(url, body, charset)
+        except Exception as e:
+            logger.warning("Error scraping %s: %s", url, e)
+            return self._error_result(url, str(e))
+    
+    async def scrape_content_async(self, session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
+        """
+        Scrape content from a URL without blocking the event loop.
+        
+        Args:
+            session: Shared aiohttp session to issue the request on
+            url: The URL to scrape
             
-            # Check if response content exists
-            if not response.content:
-                return {
-                    "url": url,
-                    "error": "Empty response content",
-                    "title": "",
-                    "content": "",
-                    "headings": []
-                }
-                
-            soup = BeautifulSoup(response.content, "html.parser")
+        Returns:
+            Dictionary containing scraped content
+        """
+        cached = self.scrape_cache.get(url)
+        if cached is not None:
+            return cached
+        
+        host = urlsplit(url).hostname or ""
+        if self._is_host_blocked(host):
+            return self._error_result(url, "Host skipped after repeated failures")
+        
+        # Spacing waits are not part of the scrape's time budget
+        await self._throttle(url)
+        try:
+            body, charset = await asyncio.wait_for(self._fetch(session, url), timeout=SCRAPE_TIMEOUT)
+        except Exception as e:
+            # Timeouts, connection errors and 5xx responses suggest the host itself is struggling;
+            # 4xx responses and unsupported content (ValueError) are about this one URL
+            if isinstance(e, aiohttp.ClientResponseError):
+                host_failure = e.status >= 500
+            else:
+                host_failure = not isinstance(e, ValueError)
+            if host_failure:
+                self._record_host_failure(host)
+            logger.warning("Error scraping %s: %s", url, str(e) or type(e).__name__)
+            return self._error_result(url, str(e) or type(e).__name__)
+        
+        self._host_failures.pop(host, None)
+        
+        # Parsing is CPU-bound; keep it off the event loop so other downloads progress
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._parse_and_cache, url, body, charset)
+    
+    async def _fetch(self, session: aiohttp.ClientSession, url: str) -> Tuple[bytes, Optional[str]]:
+        """
+        Download a page body.
+        
+        Args:
+            session: Shared aiohttp session to issue the request on
+            url: The URL to download
             
-            # Extract title with better error handling
-            title = ""
-            if soup and soup.title:
-                title = soup.title.string if soup.title.string else ""
+        Returns:
+            Tuple of (raw response body, charset declared in the Content-Type header or None)
             
-            # Extract main content
-            content = ""
+        Raises:
+            ValueError: If the response is not an HTML page
+        """
+        async with session.get(url, headers=SCRAPE_HEADERS) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if not is_html_content_type(content_type):
+                raise ValueError(f"Unsupported content type: {content_type}")
             
-            # Try to find article or main content
-            main_content = soup.find("article") or soup.find("main") or soup.find("div", class_=["content", "post", "entry", "article"])
+            # Read at most MAX_SCRAPE_BYTES; the rest of an oversized page is never downloaded
+            parts = []
+            size = 0
+            async for chunk in response.content.iter_chunked(SCRAPE_CHUNK_BYTES):
+                parts.append(chunk)
+                size += len(chunk)
+                if size >= MAX_SCRAPE_BYTES:
+                    break
+            return b"".join(parts)[:MAX_SCRAPE_BYTES], response.charset
+    
+    def _declared_charset(self, response: requests.Response) -> Optional[str]:
+        """Return the charset named in a response's Content-Type header, if any."""
+        # requests falls back to ISO-8859-1 for text/* without a charset, which is not a declaration
+        if "charset" not in response.headers.get("Content-Type", "").lower():
+            return None
+        return response.encoding
+    
+    async def _throttle(self, url: str) -> None:
+        """
+        Wait until a request to the URL's host respects that host's minimum interval.
+        
+        The next slot is reserved before sleeping, so concurrent requests to one
+        host are spaced out instead of all seeing the same idle host.
+        
+        Args:
+            url: URL about to be requested
+        """
+        host = urlsplit(url).hostname or ""
+        interval = HOST_MIN_INTERVALS.get(host, MIN_HOST_INTERVAL)
+        if interval <= 0:
+            return
+        
+        now = time.monotonic()
+        slot = max(now, self._host_last_call.get(host, now - interval) + interval)
+        self._host_last_call[host] = slot
+        if slot > now:
+            await asyncio.sleep(slot - now)
+    
+    def _is_host_blocked(self, host: str) -> bool:
+        """Check whether a host is in its cool-down period after repeated failures."""
+        blocked_until = self._blocked_hosts.get(host)
+        if blocked_until is None:
+            return False
+        if time.monotonic() >= blocked_until:
+            del self._blocked_hosts[host]
+            return False
+        return True
+    
+    def _record_host_failure(self, host: str) -> None:
+        """Count a failure for a host and block it once it fails too often in a row."""
+        failures = self._host_failures.get(host, 0) + 1
+        if failures >= HOST_FAILURE_LIMIT:
+            self._blocked_hosts[host] = time.monotonic() + HOST_BLOCK_SECONDS
+            self._host_failures.pop(host, None)
+        else:
+            self._host_failures[host] = failures
+    
+    def _parse_and_cache(self, url: str, html: bytes, encoding: Optional[str] = None) -> Dict[str, Any]:
+        """Parse a downloaded page and keep the result for later runs if it succeeded."""
+        page = self._parse_html(url, html, encoding)
+        if "error" not in page:
+            self.scrape_cache.put(url, page)
+        return page
+    
+    def _parse_html(self, url: str, html: bytes, encoding: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Extract title, main content and headings from a downloaded page.
+        
+        Args:
+            url: The URL the page was fetched from
+            html: Raw response body
+            encoding: Charset declared by the server; detected from the body if omitted
             
-            if main_content:
-                # Extract paragraphs from main content
-                for paragraph in main_content.find_all("p"):
-                    content += paragraph.get_text() + "\n\n"
-            else:
-                # Fallback to all paragraphs
-                for paragraph in soup.find_all("p"):
-                    content += paragraph.get_text() + "\n\n"
+        Returns:
+            Dictionary containing scraped content
+        """
+        # Check if response content exists
+        if not html:
+            return self._error_result(url, "Empty response content")
             
-            # Extract headings
-            headings = []
-            for heading in soup.find_all(["h1", "h2", "h3"]):
+        # A declared charset spares BeautifulSoup from sniffing the encoding itself
+        soup = BeautifulSoup(html, "lxml", parse_only=CONTENT_STRAINER, from_encoding=encoding)
+        
+        # Collect the title, paragraphs, headings and candidate content containers in a single walk
+        title_tag = None
+        paragraphs = []
+        headings = []
+        containers = {}
+        for element in soup.descendants:
+            name = element.name
+            if name == "title" and title_tag is None:
+                title_tag = element
+            elif name == "p":
+                paragraphs.append(element)
+            elif name in HEADING_TAGS:
                 # Skip empty headings or very short ones
-                text = heading.get_text().strip()
+                text = element.get_text().strip()
                 if text and len(text) > 3:
                     headings.append({
-                        "level": heading.name,
+                        "level": name,
                         "text": text
                     })
-            
-            return {
-                "url": url,
-                "title": title,
-                "content": content,
-                "headings": headings
-            }
-        except Exception as e:
-            print(f"Error scraping {url}: {str(e)}")
-            return {
-                "url": url,
-                "error": str(e),
-                "title": "",
-                "content": "",
-                "headings": []
-            }
+            elif name in ("article", "main"):
+                containers.setdefault(name, element)
+            elif name == "div" and "div" not in containers:
+                if CONTENT_DIV_CLASSES.intersection(element.get("class") or ()):
+                    containers["div"] = element
+        
+        # Prefer paragraphs inside the article or main content, falling back to all of them
+        main_content = containers.get("article") or containers.get("main") or containers.get("div")
+        if main_content is not None:
+            paragraphs = [
+                paragraph for paragraph in paragraphs
+                if any(parent is main_content for parent in paragraph.parents)
+            ]
+        content = "".join(paragraph.get_text() + "\n\n" for paragraph in paragraphs)
+        # Copy to a plain str; a NavigableString would keep the whole parsed tree alive
+        title = str(title_tag.string or "") if title_tag is not None else ""
+        
+        return {
+            "url": url,
+            "title": title,
+            "content": content,
+            "headings": headings
+        }
+    
+    def _error_result(self, url: str, error: str) -> Dict[str, Any]:
+        """Build the empty record returned when a URL cannot be scraped."""
+        return {
+            "url": url,
+            "error": error,
+            "title": "",
+            "content": "",
+            "headings": []
+        }
             
     def batch_scrape_urls(self, urls: List[str]) -> List[Dict[str, Any]]:
         """
@@ -168,7 +582,26 @@ class SearchHandler:
         Returns:
             List of dictionaries containing scraped content
         """
-        results = []
-        for url in urls:
-            results.append(self.scrape_content(url))
-        return results
+        return asyncio.run(self.batch_scrape_urls_async(urls))
+    
+    async def batch_scrape_urls_async(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """
+        Scrape content from multiple URLs concurrently.
+        
+        Args:
+            urls: List of URLs to scrape
+            
+        Returns:
+            List of dictionaries containing scraped content, in the order of urls
+        """
+        connector = aiohttp.TCPConnector(limit=100, limit_per_host=4)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            results = await asyncio.gather(
+                *[self.scrape_content_async(session, url) for url in urls],
+                return_exceptions=True
+            )
+        
+        return [
+            self._error_result(url, str(result)) if isinstance(result, BaseException) else result
+            for url, result in zip(urls, results)
+        ]